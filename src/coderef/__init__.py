@@ -2,12 +2,13 @@
 
 __version__ = "0.2.0"
 
-from .agent import query, SYSTEM_PROMPT
+from .agent import query, stream_query, SYSTEM_PROMPT
 from .main import main
 from .output import print_markdown, print_error, print_info
 
 __all__ = [
     "query",
+    "stream_query",
     "SYSTEM_PROMPT",
     "main",
     "print_markdown",
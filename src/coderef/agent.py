@@ -1,8 +1,16 @@
 """Succinct code example agent using Claude + Context7 MCP."""
 
 import os
+import sys
+from collections.abc import Iterator
+from typing import TYPE_CHECKING
 
-import anthropic
+from . import cache
+
+if TYPE_CHECKING:
+    import anthropic
+
+MODEL = "claude-haiku-4-5"
 
 SYSTEM_PROMPT = """You are a succinct code example assistant.
 
@@ -22,6 +30,57 @@ Rules:
 - If no documentation found anywhere, say "No documentation found for [query]"
 """
 
+# Static request parts, shared across calls. Treat as read-only.
+_SYSTEM = (
+    {
+        "type": "text",
+        "text": SYSTEM_PROMPT,
+        "cache_control": {"type": "ephemeral"},
+    },
+)
+
+# Context7 MCP server
+_MCP_SERVER_TEMPLATE = {
+    "type": "url",
+    "url": "https://mcp.context7.com/mcp",
+    "name": "context7",
+}
+
+# Tools: Context7 MCP + Web Search fallback. The cache breakpoint on the
+# last tool caches the whole tool prefix along with the system prompt.
+_TOOLS = (
+    {"type": "mcp_toolset", "mcp_server_name": "context7"},
+    {
+        "type": "web_search_20250305",
+        "name": "web_search",
+        "max_uses": 3,
+        "cache_control": {"type": "ephemeral"},
+    },
+)
+
+_BETAS = ("mcp-client-2025-11-20", "web-search-2025-03-05")
+
+# Block types that mark the end of a tool round-trip
+_TOOL_RESULT_TYPES = ("mcp_tool_result", "web_search_tool_result")
+
+# Shared client, created lazily so repeated queries reuse its connection pool
+_client: "anthropic.Anthropic | None" = None
+
+
+def _get_client() -> "anthropic.Anthropic":
+    """Return the shared Anthropic client, creating it on first use.
+
+    Returns:
+        The process-wide Anthropic client
+    """
+    global _client
+    if _client is None:
+        # Deferred: the SDK takes most of a second to import
+        import anthropic
+
+        _client = anthropic.Anthropic()
+    return _client
+
 
 def _extract_final_text(content_blocks: list) -> str:
     """Extract text blocks that appear after the last tool result.
@@ -35,69 +94,137 @@ def _extract_final_text(content_blocks: list) -> str:
     Returns:
         Concatenated text from blocks after the last tool result
     """
-    # Find index of last tool result block
-    last_tool_result_idx = -1
-    for i, block in enumerate(content_blocks):
-        block_type = getattr(block, "type", None)
-        if block_type in ("mcp_tool_result", "web_search_tool_result"):
-            last_tool_result_idx = i
-
-    # Collect text blocks after the last tool result
+    # Walk backwards collecting text until the last tool result is reached.
+    # With no tool results this collects every text block.
     text_parts = []
-    for i, block in enumerate(content_blocks):
-        if i > last_tool_result_idx and hasattr(block, "text"):
+    for block in reversed(content_blocks):
+        if getattr(block, "type", None) in _TOOL_RESULT_TYPES:
+            break
+        if hasattr(block, "text"):
             text_parts.append(block.text)
 
-    # Fallback: if no tool results, return all text (no filtering needed)
-    if last_tool_result_idx == -1 and not text_parts:
-        for block in content_blocks:
-            if hasattr(block, "text"):
-                text_parts.append(block.text)
+    return "".join(reversed(text_parts))
+
+
+def _request_params(question: str, max_tokens: int) -> dict:
+    """Build the Messages API parameters for a query.
+
+    Args:
+        question: The programming query
+        max_tokens: Maximum tokens in the response
+
+    Returns:
+        Keyword arguments for beta.messages.create/stream
+    """
+    # Add Context7 API key if available (as authorization token)
+    server = _MCP_SERVER_TEMPLATE
+    if api_key := os.environ.get("CONTEXT7_API_KEY"):
+        server = {**server, "authorization_token": api_key}
+
+    return {
+        "model": MODEL,
+        "max_tokens": max_tokens,
+        "system": _SYSTEM,
+        "messages": [{"role": "user", "content": question}],
+        "mcp_servers": [server],
+        "tools": _TOOLS,
+        "betas": _BETAS,
+    }
 
-    return "".join(text_parts) if text_parts else ""
 
+def _finish(
+    response: "anthropic.types.beta.BetaMessage", cache_key: str, use_cache: bool
+) -> str:
+    """Turn a completed response into the final answer and cache it.
+
+    Args:
+        response: The complete message from the API
+        cache_key: Key to store the answer under
+        use_cache: Whether to write the answer to the cache
 
-def query(question: str, max_tokens: int = 2000) -> str:
+    Returns:
+        The final answer, or a fallback message if there is none
+    """
+    if os.environ.get("DEBUG"):
+        usage = response.usage
+        print(
+            f"cache read: {usage.cache_read_input_tokens}, "
+            f"cache write: {usage.cache_creation_input_tokens}",
+            file=sys.stderr,
+        )
+
+    # Extract final text (filtering out pre-tool preamble)
+    result = _extract_final_text(response.content)
+    if not result:
+        return "No response generated"
+
+    # Only cache complete answers (not cut off at max_tokens or paused mid
+    # turn), and don't pin web search answers; they may go stale
+    if (
+        use_cache
+        and response.stop_reason == "end_turn"
+        and "(Source: web search)" not in result
+    ):
+        cache.set(cache_key, result)
+    return result
+
+
+def query(question: str, max_tokens: int = 2000, use_cache: bool = True) -> str:
     """Query the agent for a code example.
 
     Args:
         question: The programming query (e.g., "modern C++ fold_left")
         max_tokens: Maximum tokens in the response
+        use_cache: Read and write the on-disk response cache
 
     Returns:
         A concise code example with explanation
     """
-    client = anthropic.Anthropic()
+    cache_key = cache.make_key(SYSTEM_PROMPT, question, str(max_tokens), MODEL)
+    if use_cache and (cached := cache.get(cache_key)) is not None:
+        return cached
 
-    # Configure Context7 MCP server
-    mcp_servers = [
-        {
-            "type": "url",
-            "url": "https://mcp.context7.com/mcp",
-            "name": "context7",
-        }
-    ]
+    client = _get_client()
+    response = client.beta.messages.create(**_request_params(question, max_tokens))
+    return _finish(response, cache_key, use_cache)
 
-    # Add Context7 API key if available (as authorization token)
-    if api_key := os.environ.get("CONTEXT7_API_KEY"):
-        mcp_servers[0]["authorization_token"] = api_key
-
-    # Tools: Context7 MCP + Web Search fallback
-    tools = [
-        {"type": "mcp_toolset", "mcp_server_name": "context7"},
-        {"type": "web_search_20250305", "name": "web_search", "max_uses": 3},
-    ]
-
-    response = client.beta.messages.create(
-        model="claude-haiku-4-5",
-        max_tokens=max_tokens,
-        system=SYSTEM_PROMPT,
-        messages=[{"role": "user", "content": question}],
-        mcp_servers=mcp_servers,
-        tools=tools,
-        betas=["mcp-client-2025-11-20", "web-search-2025-03-05"],
-    )
 
-    # Extract final text (filtering out pre-tool preamble)
-    result = _extract_final_text(response.content)
-    return result if result else "No response generated"
+def stream_query(
+    question: str, max_tokens: int = 2000, use_cache: bool = True
+) -> Iterator[str]:
+    """Stream a code example as it is generated.
+
+    Each value yielded is the full answer so far, not a delta. Text streamed
+    before a tool result is preamble, so the answer resets to empty whenever
+    a tool result arrives. The last value yielded is the final answer.
+
+    Args:
+        question: The programming query (e.g., "modern C++ fold_left")
+        max_tokens: Maximum tokens in the response
+        use_cache: Read and write the on-disk response cache
+
+    Yields:
+        The answer text accumulated so far
+    """
+    cache_key = cache.make_key(SYSTEM_PROMPT, question, str(max_tokens), MODEL)
+    if use_cache and (cached := cache.get(cache_key)) is not None:
+        yield cached
+        return
+
+    client = _get_client()
+    params = _request_params(question, max_tokens)
+    text = ""
+    with client.beta.messages.stream(**params) as stream:
+        for event in stream:
+            if event.type == "text":
+                text += event.text
+                yield text
+            elif (
+                event.type == "content_block_start"
+                and event.content_block.type in _TOOL_RESULT_TYPES
+            ):
+                text = ""
+                yield text
+        response = stream.get_final_message()
+
+    yield _finish(response, cache_key, use_cache)
@@ -0,0 +1,103 @@
+"""On-disk response cache for coderef."""
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+# Cache location; one JSON file per cached response
+CACHE_DIR = Path.home() / ".coderef" / "cache"
+
+# Default time-to-live for cached responses (seconds)
+DEFAULT_TTL = 86400
+
+
+def make_key(*parts: str) -> str:
+    """Build a cache key from the inputs that determine a response.
+
+    Args:
+        parts: Values that together identify a response (prompt, question, ...)
+
+    Returns:
+        Hex SHA-256 digest of the parts
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def get(key: str) -> str | None:
+    """Return a cached response, or None if missing, expired, or unreadable.
+
+    Args:
+        key: Cache key from make_key()
+
+    Returns:
+        The cached response text, if any
+    """
+    path = CACHE_DIR / f"{key}.json"
+    try:
+        entry = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if not isinstance(entry, dict):
+        return None
+
+    expires = entry.get("expires")
+    result = entry.get("result")
+    if (
+        not isinstance(expires, (int, float))
+        or not isinstance(result, str)
+        or expires < time.time()
+    ):
+        path.unlink(missing_ok=True)
+        return None
+    return result
+
+
+def set(key: str, result: str, expire: int = DEFAULT_TTL) -> None:
+    """Store a response in the cache and prune expired entries.
+
+    Each file's mtime is set to its expiry time, so pruning only needs to
+    stat the directory. Failures to write are ignored; the cache is
+    best-effort.
+
+    Args:
+        key: Cache key from make_key()
+        result: Response text to store
+        expire: Time-to-live in seconds
+    """
+    now = time.time()
+    expires = now + expire
+    path = CACHE_DIR / f"{key}.json"
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        entry = {"expires": expires, "result": result}
+        path.write_text(json.dumps(entry), encoding="utf-8")
+        os.utime(path, (expires, expires))
+    except OSError:
+        return
+
+    _prune(now)
+
+
+def _prune(now: float) -> None:
+    """Delete cache files whose expiry (stored as mtime) has passed.
+
+    Args:
+        now: Current time as a Unix timestamp
+    """
+    try:
+        entries = list(os.scandir(CACHE_DIR))
+    except OSError:
+        return
+
+    for entry in entries:
+        try:
+            if entry.name.endswith(".json") and entry.stat().st_mtime < now:
+                os.unlink(entry.path)
+        except OSError:
+            pass
@@ -3,20 +3,17 @@
 import os
 import sys
 
-import anthropic
 import click
-from rich.console import Console
-from rich.markdown import Markdown
 
-from .agent import query
-
-console = Console()
+from .agent import stream_query
+from .output import get_console, parse_markdown, print_api_error, print_error
 
 
 @click.command()
 @click.argument("question", type=str)
 @click.option("--tokens", "-t", type=int, default=2000, help="Max response tokens")
-def main(question: str, tokens: int) -> None:
+@click.option("--no-cache", is_flag=True, help="Bypass the local response cache")
+def main(question: str, tokens: int, no_cache: bool) -> None:
     """Get succinct code examples for programming queries.
 
     Examples:
@@ -28,17 +25,38 @@ def main(question: str, tokens: int) -> None:
         coderef "Python asyncio gather"
     """
     if not os.environ.get("ANTHROPIC_API_KEY"):
-        console.print("[red]Error:[/red] Set ANTHROPIC_API_KEY environment variable")
+        print_error("Set ANTHROPIC_API_KEY environment variable")
         sys.exit(1)
 
+    # Deferred until arguments and environment have been validated
+    from rich.live import Live
+
+    console = get_console()
     try:
-        result = query(question, max_tokens=tokens)
-        console.print(Markdown(result))
-    except anthropic.APIError as e:
-        console.print(f"[red]API Error:[/red] {e}")
-        sys.exit(1)
+        # Each value from stream_query is the full answer so far. Live pulls
+        # the latest one at its refresh rate, so Markdown isn't re-parsed on
+        # every token, and parse_markdown skips refreshes with no new text.
+        answer = ""
+        with Live(
+            get_renderable=lambda: parse_markdown(answer),
+            console=console,
+            refresh_per_second=8,
+        ):
+            for answer in stream_query(
+                question, max_tokens=tokens, use_cache=not no_cache
+            ):
+                pass
+        if not console.is_terminal:
+            # Live only ends its last line itself when writing to a terminal
+            console.line()
     except Exception as e:
-        console.print(f"[red]Error:[/red] {e}")
+        # The SDK is only loaded once a request has been made; a cache hit
+        # never imports it, so don't import it here just for the check
+        anthropic = sys.modules.get("anthropic")
+        if anthropic is not None and isinstance(e, anthropic.APIError):
+            print_api_error(str(e))
+        else:
+            print_error(str(e))
         sys.exit(1)
 
 
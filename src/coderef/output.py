@@ -1,10 +1,56 @@
 """Output formatting with Rich for coderef."""
 
-from rich.console import Console
-from rich.markdown import Markdown
+from functools import lru_cache
+from typing import TYPE_CHECKING
 
-# Shared console instance
-console = Console()
+if TYPE_CHECKING:
+    from rich.console import Console
+    from rich.markdown import Markdown
+
+# Shared console instance for all coderef output, created on first use so
+# importing this module doesn't pull in Rich
+_console: "Console | None" = None
+
+# Label and style for each message level
+_LEVELS = {
+    "error": ("Error:", "red"),
+    "api_error": ("API Error:", "red"),
+    "info": ("Info:", "cyan"),
+}
+
+
+def get_console() -> "Console":
+    """Return the shared console, creating it on first use.
+
+    Returns:
+        The shared Rich console
+    """
+    global _console
+    if _console is None:
+        from rich.console import Console
+
+        # Everything is printed as Markdown or Text renderables, so markup,
+        # repr highlighting and emoji codes would only cost regex passes
+        _console = Console(markup=False, highlight=False, emoji=False)
+    return _console
+
+
+@lru_cache(maxsize=64)
+def parse_markdown(text: str) -> "Markdown":
+    """Parse text into a Markdown renderable, reusing recent results.
+
+    Live displays ask for the renderable on every refresh, often with text
+    that hasn't changed since the last one.
+
+    Args:
+        text: Markdown text to parse
+
+    Returns:
+        A Rich Markdown renderable
+    """
+    from rich.markdown import Markdown
+
+    return Markdown(text)
 
 
 def print_markdown(text: str) -> None:
@@ -13,7 +59,7 @@ def print_markdown(text: str) -> None:
     Args:
         text: Markdown text to format and print
     """
-    console.print(Markdown(text))
+    get_console().print(parse_markdown(text))
 
 
 def print_error(message: str) -> None:
@@ -22,7 +68,16 @@ def print_error(message: str) -> None:
     Args:
         message: Error message to display
     """
-    console.print(f"[red]Error:[/red] {message}")
+    _print_message("error", message)
+
+
+def print_api_error(message: str) -> None:
+    """Print an error reported by the Anthropic API.
+
+    Args:
+        message: Error message to display
+    """
+    _print_message("api_error", message)
 
 
 def print_info(message: str) -> None:
@@ -31,4 +86,20 @@ def print_info(message: str) -> None:
     Args:
         message: Info message to display
     """
-    console.print(f"[cyan]Info:[/cyan] {message}")
+    _print_message("info", message)
+
+
+def _print_message(level: str, message: str) -> None:
+    """Print a message with the label and style for its level.
+
+    The message is printed as plain text, so brackets in it (common in
+    exception messages) are not parsed as Rich markup.
+
+    Args:
+        level: Key into _LEVELS
+        message: Message to display
+    """
+    from rich.text import Text
+
+    label, style = _LEVELS[level]
+    get_console().print(Text.assemble((label, style), " ", message))
@@ -0,0 +1,30 @@
+"""Shared pytest fixtures for coderef tests."""
+
+import sys
+import types
+from unittest.mock import MagicMock
+
+import pytest
+
+
+@pytest.fixture
+def mock_client(monkeypatch):
+    """Replace the anthropic SDK with a stub module for one test.
+
+    coderef imports anthropic lazily, so installing the stub in sys.modules
+    means the real SDK is never imported by the test suite.
+
+    Returns:
+        The stub's Anthropic class; its return_value is the client
+    """
+    stub = types.ModuleType("anthropic")
+    stub.Anthropic = MagicMock(name="Anthropic")
+    monkeypatch.setitem(sys.modules, "anthropic", stub)
+    return stub.Anthropic
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    """Point the response cache at a per-test directory."""
+    monkeypatch.setattr("coderef.cache.CACHE_DIR", tmp_path / "cache")
+    return tmp_path / "cache"
@@ -1,96 +1,130 @@
 """Tests for the coderef agent."""
 
-from unittest.mock import MagicMock, patch
+from dataclasses import dataclass
+from types import SimpleNamespace
+from unittest.mock import patch
 
 import pytest
 
 
+@dataclass(slots=True)
+class TextBlock:
+    """Stand-in for a text content block."""
+
+    text: str
+    type: str = "text"
+
+
+@dataclass(slots=True)
+class ToolBlock:
+    """Stand-in for a tool use/result block (no text attribute)."""
+
+    type: str
+
+
+@pytest.fixture(autouse=True)
+def reset_client():
+    """Drop the cached Anthropic client so each test sees a fresh stub."""
+    import coderef.agent
+
+    coderef.agent._client = None
+    yield
+    coderef.agent._client = None
+
+
 class TestQuery:
     """Tests for the query function."""
 
-    def test_query_returns_text_content(self):
+    def test_query_returns_text_content(self, mock_client):
         """Should extract text from response content blocks."""
-        mock_response = MagicMock()
-        mock_block = MagicMock()
-        mock_block.text = "```python\nprint('hello')\n```\nPrints hello."
-        mock_response.content = [mock_block]
+        mock_block = TextBlock("```python\nprint('hello')\n```\nPrints hello.")
+        mock_response = SimpleNamespace(content=[mock_block], stop_reason="end_turn")
 
-        with patch("coderef.agent.anthropic.Anthropic") as mock_client:
-            mock_client.return_value.beta.messages.create.return_value = mock_response
+        mock_client.return_value.beta.messages.create.return_value = mock_response
 
-            from coderef.agent import query
+        from coderef.agent import query
 
-            result = query("Python print hello")
+        result = query("Python print hello")
 
         assert "print('hello')" in result
 
-    def test_query_concatenates_multiple_text_blocks(self):
+    def test_query_concatenates_multiple_text_blocks(self, mock_client):
         """Should concatenate all text blocks from response."""
-        mock_response = MagicMock()
-        mock_tool_block = MagicMock(spec=[])  # No text attr
-        mock_text_block1 = MagicMock()
-        mock_text_block1.text = "Part 1. "
-        mock_text_block2 = MagicMock()
-        mock_text_block2.text = "Part 2."
-        mock_response.content = [mock_tool_block, mock_text_block1, mock_text_block2]
+        mock_tool_block = ToolBlock("mcp_tool_use")
+        mock_text_block1 = TextBlock("Part 1. ")
+        mock_text_block2 = TextBlock("Part 2.")
+        mock_response = SimpleNamespace(
+            content=[mock_tool_block, mock_text_block1, mock_text_block2],
+            stop_reason="end_turn",
+        )
 
-        with patch("coderef.agent.anthropic.Anthropic") as mock_client:
-            mock_client.return_value.beta.messages.create.return_value = mock_response
+        mock_client.return_value.beta.messages.create.return_value = mock_response
 
-            from coderef.agent import query
+        from coderef.agent import query
 
-            result = query("test query")
+        result = query("test query")
 
         assert result == "Part 1. Part 2."
 
-    def test_query_uses_correct_model(self):
+    def test_query_uses_correct_model(self, mock_client):
         """Should use claude-haiku-4-5 model."""
-        with patch("coderef.agent.anthropic.Anthropic") as mock_client:
-            mock_create = mock_client.return_value.beta.messages.create
-            mock_create.return_value.content = []
+        mock_create = mock_client.return_value.beta.messages.create
+        mock_create.return_value.content = []
 
-            from coderef.agent import query
+        from coderef.agent import query
 
-            query("test query")
+        query("test query")
 
-            call_kwargs = mock_create.call_args.kwargs
-            assert call_kwargs["model"] == "claude-haiku-4-5"
+        call_kwargs = mock_create.call_args.kwargs
+        assert call_kwargs["model"] == "claude-haiku-4-5"
 
-    def test_query_includes_mcp_server(self):
+    def test_query_includes_mcp_server(self, mock_client):
         """Should include Context7 MCP server configuration."""
-        with patch("coderef.agent.anthropic.Anthropic") as mock_client:
-            mock_create = mock_client.return_value.beta.messages.create
-            mock_create.return_value.content = []
+        mock_create = mock_client.return_value.beta.messages.create
+        mock_create.return_value.content = []
 
-            from coderef.agent import query
+        from coderef.agent import query
 
-            query("test query")
+        query("test query")
 
-            call_kwargs = mock_create.call_args.kwargs
-            assert "mcp_servers" in call_kwargs
-            assert (
-                call_kwargs["mcp_servers"][0]["url"] == "https://mcp.context7.com/mcp"
-            )
-            assert call_kwargs["mcp_servers"][0]["name"] == "context7"
+        call_kwargs = mock_create.call_args.kwargs
+        assert "mcp_servers" in call_kwargs
+        assert (
+            call_kwargs["mcp_servers"][0]["url"] == "https://mcp.context7.com/mcp"
+        )
+        assert call_kwargs["mcp_servers"][0]["name"] == "context7"
 
-    def test_query_includes_tools(self):
+    def test_query_includes_tools(self, mock_client):
         """Should include mcp_toolset and web_search tools."""
-        with patch("coderef.agent.anthropic.Anthropic") as mock_client:
-            mock_create = mock_client.return_value.beta.messages.create
-            mock_create.return_value.content = []
+        mock_create = mock_client.return_value.beta.messages.create
+        mock_create.return_value.content = []
 
-            from coderef.agent import query
+        from coderef.agent import query
 
-            query("test query")
+        query("test query")
 
-            call_kwargs = mock_create.call_args.kwargs
-            tool_types = [t["type"] for t in call_kwargs["tools"]]
-            assert "mcp_toolset" in tool_types
-            assert "web_search_20250305" in tool_types
+        call_kwargs = mock_create.call_args.kwargs
+        tool_types = [t["type"] for t in call_kwargs["tools"]]
+        assert "mcp_toolset" in tool_types
+        assert "web_search_20250305" in tool_types
 
-    def test_query_includes_betas(self):
+    def test_query_includes_betas(self, mock_client):
         """Should include required beta features."""
-        with patch("coderef.agent.anthropic.Anthropic") as mock_client:
+        mock_create = mock_client.return_value.beta.messages.create
+        mock_create.return_value.content = []
+
+        from coderef.agent import query
+
+        query("test query")
+
+        call_kwargs = mock_create.call_args.kwargs
+        betas = call_kwargs["betas"]
+        assert "mcp-client-2025-11-20" in betas
+        assert "web-search-2025-03-05" in betas
+
+    def test_query_adds_context7_api_key_when_set(self, mock_client):
+        """Should add Context7 API key as authorization_token when env var is set."""
+        with patch.dict("os.environ", {"CONTEXT7_API_KEY": "test-key"}):
             mock_create = mock_client.return_value.beta.messages.create
             mock_create.return_value.content = []
 
@@ -99,65 +133,235 @@ class TestQuery:
             query("test query")
 
             call_kwargs = mock_create.call_args.kwargs
-            betas = call_kwargs["betas"]
-            assert "mcp-client-2025-11-20" in betas
-            assert "web-search-2025-03-05" in betas
+            assert (
+                call_kwargs["mcp_servers"][0].get("authorization_token")
+                == "test-key"
+            )
 
-    def test_query_adds_context7_api_key_when_set(self):
-        """Should add Context7 API key as authorization_token when env var is set."""
-        with patch("coderef.agent.anthropic.Anthropic") as mock_client:
-            with patch.dict("os.environ", {"CONTEXT7_API_KEY": "test-key"}):
-                mock_create = mock_client.return_value.beta.messages.create
-                mock_create.return_value.content = []
+    def test_query_does_not_mutate_mcp_server_template(self, mock_client):
+        """Adding the Context7 API key should not leak into later calls."""
+        mock_create = mock_client.return_value.beta.messages.create
+        mock_create.return_value.content = []
 
-                from coderef.agent import query
+        from coderef.agent import query
 
-                query("test query")
+        with patch.dict("os.environ", {"CONTEXT7_API_KEY": "test-key"}):
+            query("first query")
+        with patch.dict("os.environ", clear=True):
+            query("second query")
 
-                call_kwargs = mock_create.call_args.kwargs
-                assert (
-                    call_kwargs["mcp_servers"][0].get("authorization_token")
-                    == "test-key"
-                )
+        call_kwargs = mock_create.call_args.kwargs
+        assert "authorization_token" not in call_kwargs["mcp_servers"][0]
 
-    def test_query_returns_fallback_on_empty_response(self):
+    def test_query_returns_fallback_on_empty_response(self, mock_client):
         """Should return fallback message when no content blocks."""
-        with patch("coderef.agent.anthropic.Anthropic") as mock_client:
-            mock_create = mock_client.return_value.beta.messages.create
-            mock_create.return_value.content = []
+        mock_create = mock_client.return_value.beta.messages.create
+        mock_create.return_value.content = []
 
-            from coderef.agent import query
+        from coderef.agent import query
 
-            result = query("test query")
+        result = query("test query")
 
-            assert result == "No response generated"
+        assert result == "No response generated"
 
-    def test_query_respects_max_tokens(self):
+    def test_query_respects_max_tokens(self, mock_client):
         """Should pass max_tokens to API call."""
-        with patch("coderef.agent.anthropic.Anthropic") as mock_client:
-            mock_create = mock_client.return_value.beta.messages.create
-            mock_create.return_value.content = []
+        mock_create = mock_client.return_value.beta.messages.create
+        mock_create.return_value.content = []
 
-            from coderef.agent import query
+        from coderef.agent import query
 
-            query("test query", max_tokens=500)
+        query("test query", max_tokens=500)
 
-            call_kwargs = mock_create.call_args.kwargs
-            assert call_kwargs["max_tokens"] == 500
+        call_kwargs = mock_create.call_args.kwargs
+        assert call_kwargs["max_tokens"] == 500
 
-    def test_query_uses_system_prompt(self):
+    def test_query_uses_system_prompt(self, mock_client):
         """Should include the system prompt in API call."""
-        with patch("coderef.agent.anthropic.Anthropic") as mock_client:
-            mock_create = mock_client.return_value.beta.messages.create
-            mock_create.return_value.content = []
+        mock_create = mock_client.return_value.beta.messages.create
+        mock_create.return_value.content = []
 
-            from coderef.agent import query
+        from coderef.agent import query
 
-            query("test query")
+        query("test query")
 
-            call_kwargs = mock_create.call_args.kwargs
-            assert "system" in call_kwargs
-            assert "succinct" in call_kwargs["system"].lower()
+        call_kwargs = mock_create.call_args.kwargs
+        assert "system" in call_kwargs
+        assert "succinct" in call_kwargs["system"][0]["text"].lower()
+
+    def test_query_marks_prompt_prefix_cacheable(self, mock_client):
+        """Should mark the system prompt and tool list for prompt caching."""
+        mock_create = mock_client.return_value.beta.messages.create
+        mock_create.return_value.content = []
+
+        from coderef.agent import query
+
+        query("test query")
+
+        call_kwargs = mock_create.call_args.kwargs
+        ephemeral = {"type": "ephemeral"}
+        assert call_kwargs["system"][0]["cache_control"] == ephemeral
+        assert call_kwargs["tools"][-1]["cache_control"] == ephemeral
+
+    def test_query_reuses_client_across_calls(self, mock_client):
+        """Should construct the Anthropic client once and reuse it."""
+        mock_client.return_value.beta.messages.create.return_value.content = []
+
+        from coderef.agent import query
+
+        query("first query")
+        query("second query")
+
+        mock_client.assert_called_once()
+
+    def test_query_returns_cached_response_on_repeat(self, mock_client):
+        """Should serve a repeated query from the cache without an API call."""
+        mock_block = TextBlock("Cached answer.")
+
+        mock_create = mock_client.return_value.beta.messages.create
+        mock_create.return_value.content = [mock_block]
+        mock_create.return_value.stop_reason = "end_turn"
+
+        from coderef.agent import query
+
+        first = query("test query")
+        second = query("test query")
+
+        assert first == second == "Cached answer."
+        mock_create.assert_called_once()
+
+    def test_query_bypasses_cache_when_disabled(self, mock_client):
+        """Should always call the API when use_cache is False."""
+        mock_block = TextBlock("Fresh answer.")
+
+        mock_create = mock_client.return_value.beta.messages.create
+        mock_create.return_value.content = [mock_block]
+        mock_create.return_value.stop_reason = "end_turn"
+
+        from coderef.agent import query
+
+        query("test query", use_cache=False)
+        query("test query", use_cache=False)
+
+        assert mock_create.call_count == 2
+
+    def test_query_does_not_cache_web_search_answers(self, mock_client):
+        """Should not cache responses sourced from web search."""
+        mock_block = TextBlock("Answer. (Source: web search)")
+
+        mock_create = mock_client.return_value.beta.messages.create
+        mock_create.return_value.content = [mock_block]
+        mock_create.return_value.stop_reason = "end_turn"
+
+        from coderef.agent import query
+
+        query("test query")
+        query("test query")
+
+        assert mock_create.call_count == 2
+
+    def test_query_does_not_cache_truncated_answers(self, mock_client):
+        """Should not cache an answer cut off at max_tokens."""
+        mock_response = SimpleNamespace(
+            content=[TextBlock("```python\nprint(")], stop_reason="max_tokens"
+        )
+        mock_create = mock_client.return_value.beta.messages.create
+        mock_create.return_value = mock_response
+
+        from coderef.agent import query
+
+        query("test query")
+        query("test query")
+
+        assert mock_create.call_count == 2
+
+
+class TestStreamQuery:
+    """Tests for the streaming query function."""
+
+    @staticmethod
+    def _setup_stream(mock_client, events, final_blocks):
+        """Configure the mocked client to stream events then a final message."""
+        stream_cm = mock_client.return_value.beta.messages.stream.return_value
+        stream = stream_cm.__enter__.return_value
+        stream.__iter__.return_value = iter(events)
+        stream.get_final_message.return_value.content = final_blocks
+        stream.get_final_message.return_value.stop_reason = "end_turn"
+        return mock_client.return_value.beta.messages.stream
+
+    def test_stream_yields_accumulated_text(self, mock_client):
+        """Should yield the answer accumulated so far after each text delta."""
+        final_block = TextBlock("Hello world.")
+        events = [
+            SimpleNamespace(type="text", text="Hello "),
+            SimpleNamespace(type="text", text="world."),
+        ]
+
+        self._setup_stream(mock_client, events, [final_block])
+
+        from coderef.agent import stream_query
+
+        snapshots = list(stream_query("test query"))
+
+        assert snapshots == ["Hello ", "Hello world.", "Hello world."]
+
+    def test_stream_resets_on_tool_result(self, mock_client):
+        """Should drop preamble text once a tool result arrives."""
+        tool_result = ToolBlock("mcp_tool_result")
+        final_block = TextBlock("Answer.")
+        events = [
+            SimpleNamespace(type="text", text="I'll search..."),
+            SimpleNamespace(
+                type="content_block_start",
+                content_block=SimpleNamespace(type="mcp_tool_result"),
+            ),
+            SimpleNamespace(type="text", text="Answer."),
+        ]
+
+        self._setup_stream(mock_client, events, [tool_result, final_block])
+
+        from coderef.agent import stream_query
+
+        snapshots = list(stream_query("test query"))
+
+        assert snapshots == ["I'll search...", "", "Answer.", "Answer."]
+
+    def test_stream_uses_same_request_as_query(self, mock_client):
+        """Should send the same model, system prompt and tools as query()."""
+        mock_stream = self._setup_stream(mock_client, [], [])
+
+        from coderef.agent import stream_query
+
+        list(stream_query("test query", max_tokens=500))
+
+        call_kwargs = mock_stream.call_args.kwargs
+        assert call_kwargs["model"] == "claude-haiku-4-5"
+        assert call_kwargs["max_tokens"] == 500
+        assert "mcp_servers" in call_kwargs
+
+    def test_stream_yields_fallback_on_empty_response(self, mock_client):
+        """Should end with the fallback message when there is no answer."""
+        self._setup_stream(mock_client, [], [])
+
+        from coderef.agent import stream_query
+
+        snapshots = list(stream_query("test query"))
+
+        assert snapshots == ["No response generated"]
+
+    def test_stream_serves_cached_response(self, mock_client):
+        """Should yield a cached answer without opening a stream."""
+        final_block = TextBlock("Cached answer.")
+
+        mock_stream = self._setup_stream(mock_client, [], [final_block])
+
+        from coderef.agent import stream_query
+
+        list(stream_query("test query"))
+        snapshots = list(stream_query("test query"))
+
+        assert snapshots == ["Cached answer."]
+        mock_stream.assert_called_once()
 
 
 class TestExtractFinalText:
@@ -168,19 +372,10 @@ class TestExtractFinalText:
         from coderef.agent import _extract_final_text
 
         # Simulate: [text, mcp_tool_use, mcp_tool_result, text]
-        preamble = MagicMock()
-        preamble.type = "text"
-        preamble.text = "I'll search for that..."
-
-        tool_use = MagicMock(spec=[])  # No text attr
-        tool_use.type = "mcp_tool_use"
-
-        tool_result = MagicMock(spec=[])  # No text attr
-        tool_result.type = "mcp_tool_result"
-
-        final_text = MagicMock()
-        final_text.type = "text"
-        final_text.text = "```python\nprint('hello')\n```"
+        preamble = TextBlock("I'll search for that...")
+        tool_use = ToolBlock("mcp_tool_use")
+        tool_result = ToolBlock("mcp_tool_result")
+        final_text = TextBlock("```python\nprint('hello')\n```")
 
         blocks = [preamble, tool_use, tool_result, final_text]
         result = _extract_final_text(blocks)
@@ -193,29 +388,13 @@ class TestExtractFinalText:
         from coderef.agent import _extract_final_text
 
         # Simulate: [text, tool_use, tool_result, text, tool_use, tool_result, text]
-        preamble1 = MagicMock()
-        preamble1.type = "text"
-        preamble1.text = "First I'll resolve the library..."
-
-        tool_use1 = MagicMock(spec=[])
-        tool_use1.type = "mcp_tool_use"
-
-        tool_result1 = MagicMock(spec=[])
-        tool_result1.type = "mcp_tool_result"
-
-        preamble2 = MagicMock()
-        preamble2.type = "text"
-        preamble2.text = "Now I'll query the docs..."
-
-        tool_use2 = MagicMock(spec=[])
-        tool_use2.type = "mcp_tool_use"
-
-        tool_result2 = MagicMock(spec=[])
-        tool_result2.type = "mcp_tool_result"
-
-        final_text = MagicMock()
-        final_text.type = "text"
-        final_text.text = "Here's the code example."
+        preamble1 = TextBlock("First I'll resolve the library...")
+        tool_use1 = ToolBlock("mcp_tool_use")
+        tool_result1 = ToolBlock("mcp_tool_result")
+        preamble2 = TextBlock("Now I'll query the docs...")
+        tool_use2 = ToolBlock("mcp_tool_use")
+        tool_result2 = ToolBlock("mcp_tool_result")
+        final_text = TextBlock("Here's the code example.")
 
         blocks = [
             preamble1,
@@ -236,19 +415,10 @@ class TestExtractFinalText:
         """Should also filter based on web_search_tool_result."""
         from coderef.agent import _extract_final_text
 
-        preamble = MagicMock()
-        preamble.type = "text"
-        preamble.text = "I'll search the web..."
-
-        tool_use = MagicMock(spec=[])
-        tool_use.type = "server_tool_use"
-
-        tool_result = MagicMock(spec=[])
-        tool_result.type = "web_search_tool_result"
-
-        final_text = MagicMock()
-        final_text.type = "text"
-        final_text.text = "Based on web search: here's the answer."
+        preamble = TextBlock("I'll search the web...")
+        tool_use = ToolBlock("server_tool_use")
+        tool_result = ToolBlock("web_search_tool_result")
+        final_text = TextBlock("Based on web search: here's the answer.")
 
         blocks = [preamble, tool_use, tool_result, final_text]
         result = _extract_final_text(blocks)
@@ -260,13 +430,8 @@ class TestExtractFinalText:
         """When no tool results, return all text blocks."""
         from coderef.agent import _extract_final_text
 
-        text1 = MagicMock()
-        text1.type = "text"
-        text1.text = "Part 1. "
-
-        text2 = MagicMock()
-        text2.type = "text"
-        text2.text = "Part 2."
+        text1 = TextBlock("Part 1. ")
+        text2 = TextBlock("Part 2.")
 
         blocks = [text1, text2]
         result = _extract_final_text(blocks)
@@ -277,15 +442,9 @@ class TestExtractFinalText:
         """Return empty string when tools used but no text after."""
         from coderef.agent import _extract_final_text
 
-        preamble = MagicMock()
-        preamble.type = "text"
-        preamble.text = "I'll search..."
-
-        tool_use = MagicMock(spec=[])
-        tool_use.type = "mcp_tool_use"
-
-        tool_result = MagicMock(spec=[])
-        tool_result.type = "mcp_tool_result"
+        preamble = TextBlock("I'll search...")
+        tool_use = ToolBlock("mcp_tool_use")
+        tool_result = ToolBlock("mcp_tool_result")
 
         blocks = [preamble, tool_use, tool_result]
         result = _extract_final_text(blocks)
@@ -296,16 +455,9 @@ class TestExtractFinalText:
         """Should concatenate multiple text blocks after the last tool result."""
         from coderef.agent import _extract_final_text
 
-        tool_result = MagicMock(spec=[])
-        tool_result.type = "mcp_tool_result"
-
-        text1 = MagicMock()
-        text1.type = "text"
-        text1.text = "```python\ncode\n```\n"
-
-        text2 = MagicMock()
-        text2.type = "text"
-        text2.text = "This code does X."
+        tool_result = ToolBlock("mcp_tool_result")
+        text1 = TextBlock("```python\ncode\n```\n")
+        text2 = TextBlock("This code does X.")
 
         blocks = [tool_result, text1, text2]
         result = _extract_final_text(blocks)
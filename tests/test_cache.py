@@ -0,0 +1,75 @@
+"""Tests for the coderef response cache."""
+
+import os
+
+from coderef import cache
+
+
+class TestMakeKey:
+    """Tests for cache key construction."""
+
+    def test_same_inputs_give_same_key(self):
+        """Identical inputs should map to the same key."""
+        assert cache.make_key("a", "b") == cache.make_key("a", "b")
+
+    def test_part_boundaries_are_significant(self):
+        """Moving text between parts should change the key."""
+        assert cache.make_key("ab", "c") != cache.make_key("a", "bc")
+
+
+class TestGetSet:
+    """Tests for reading and writing cache entries."""
+
+    def test_get_returns_none_when_missing(self):
+        """Unknown keys should miss."""
+        assert cache.get("missing") is None
+
+    def test_set_then_get_round_trips(self):
+        """Stored results should be returned on lookup."""
+        cache.set("key", "result")
+
+        assert cache.get("key") == "result"
+
+    def test_get_drops_expired_entries(self, cache_dir):
+        """Expired entries should miss and be removed from disk."""
+        cache.set("key", "result", expire=-1)
+
+        assert cache.get("key") is None
+        assert not (cache_dir / "key.json").exists()
+
+    def test_get_ignores_corrupt_entries(self, cache_dir):
+        """Unreadable entries should be treated as a miss."""
+        cache_dir.mkdir(parents=True)
+        (cache_dir / "key.json").write_text("not json")
+
+        assert cache.get("key") is None
+
+    def test_get_ignores_non_object_entries(self, cache_dir):
+        """Valid JSON that isn't an object should be treated as a miss."""
+        cache_dir.mkdir(parents=True)
+        (cache_dir / "key.json").write_text("[1, 2]")
+
+        assert cache.get("key") is None
+
+    def test_get_drops_entries_with_bad_fields(self, cache_dir):
+        """Objects with mistyped expires/result should miss and be removed."""
+        cache_dir.mkdir(parents=True)
+        path = cache_dir / "key.json"
+        for entry in (
+            '{"expires": null, "result": "x"}',
+            '{"expires": 1e20, "result": 5}',
+            '{"result": "x"}',
+        ):
+            path.write_text(entry)
+
+            assert cache.get("key") is None
+            assert not path.exists()
+
+    def test_set_prunes_other_expired_entries(self, cache_dir):
+        """Writing an entry should remove expired entries for other keys."""
+        cache.set("old", "stale")
+        os.utime(cache_dir / "old.json", (0, 0))  # Expiry long past
+        cache.set("new", "fresh")
+
+        assert not (cache_dir / "old.json").exists()
+        assert cache.get("new") == "fresh"
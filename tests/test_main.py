@@ -0,0 +1,57 @@
+"""Tests for the coderef CLI entry point."""
+
+import sys
+import types
+
+from click.testing import CliRunner
+
+from coderef import cache
+from coderef.agent import MODEL, SYSTEM_PROMPT
+from coderef.main import main
+
+
+class TestMain:
+    """Tests for the main command."""
+
+    def test_cache_hit_does_not_import_sdk(self, monkeypatch):
+        """A cached answer should be printed without loading anthropic."""
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+        monkeypatch.delitem(sys.modules, "anthropic", raising=False)
+        key = cache.make_key(SYSTEM_PROMPT, "cached q", "2000", MODEL)
+        cache.set(key, "Cached answer.")
+
+        result = CliRunner().invoke(main, ["cached q"])
+
+        assert result.exit_code == 0
+        assert "Cached answer." in result.output
+        assert "anthropic" not in sys.modules
+
+    def test_missing_api_key_exits_with_error(self, monkeypatch):
+        """Should exit 1 with a message when ANTHROPIC_API_KEY is unset."""
+        monkeypatch.delenv("ANTHROPIC_API_KEY", raising=False)
+
+        result = CliRunner().invoke(main, ["q"])
+
+        assert result.exit_code == 1
+        assert "ANTHROPIC_API_KEY" in result.output
+
+    def test_api_error_is_labelled_and_printed_literally(self, monkeypatch):
+        """SDK errors should get the API Error label with brackets intact."""
+
+        class APIError(Exception):
+            pass
+
+        def failing_stream(*args, **kwargs):
+            raise APIError("400 [bad request]")
+            yield
+
+        stub = types.ModuleType("anthropic")
+        stub.APIError = APIError
+        monkeypatch.setitem(sys.modules, "anthropic", stub)
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+        monkeypatch.setattr(sys.modules["coderef.main"], "stream_query", failing_stream)
+
+        result = CliRunner().invoke(main, ["q"])
+
+        assert result.exit_code == 1
+        assert "API Error: 400 [bad request]" in result.output
@@ -0,0 +1,44 @@
+"""Tests for coderef output helpers."""
+
+from coderef.output import parse_markdown, print_api_error, print_error, print_info
+
+
+class TestMessages:
+    """Tests for labelled message output."""
+
+    def test_print_error_prefixes_label(self, capsys):
+        """Should print the message after an Error: label."""
+        print_error("something broke")
+
+        assert capsys.readouterr().out == "Error: something broke\n"
+
+    def test_print_info_prefixes_label(self, capsys):
+        """Should print the message after an Info: label."""
+        print_info("all good")
+
+        assert capsys.readouterr().out == "Info: all good\n"
+
+    def test_print_api_error_prefixes_label(self, capsys):
+        """Should print API errors after an API Error: label, without markup."""
+        print_api_error("400 {'error': [bold]bad[/bold]}")
+
+        out = capsys.readouterr().out
+        assert out == "API Error: 400 {'error': [bold]bad[/bold]}\n"
+
+    def test_message_brackets_are_not_markup(self, capsys):
+        """Brackets in the message should be printed literally."""
+        print_error("bad value [bold]x[/bold]")
+
+        assert "[bold]x[/bold]" in capsys.readouterr().out
+
+
+class TestParseMarkdown:
+    """Tests for Markdown parsing."""
+
+    def test_reuses_renderable_for_same_text(self):
+        """Repeated text should return the same parsed renderable."""
+        assert parse_markdown("# Title") is parse_markdown("# Title")
+
+    def test_parses_new_text(self):
+        """Different text should produce a different renderable."""
+        assert parse_markdown("# One") is not parse_markdown("# Two")